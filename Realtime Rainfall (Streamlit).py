@@ -4,13 +4,27 @@ Streamlit in Snowflake Application
 Texas Farm Credit
 """
 
+import re
+
+import numpy as np
 import streamlit as st
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 import pandas as pd
 from snowflake.snowpark.context import get_active_session
 
+# Copy-on-write lets sliced frames share buffers until first write —
+# the display path slices, sorts and reads but never mutates in place.
+pd.options.mode.copy_on_write = True
+
 session = get_active_session()
 
+# Jan–Feb interval window. Bound as parameters so the SQL text stays
+# byte-identical across runs and keeps hitting Snowflake's 24h result
+# cache even if these become dynamic later.
+SEASON_START = "2026-01-01"
+SEASON_END = "2026-02-28"
+
 FC_GREEN = "#5E9732"
 FC_SLATE = "#5B707F"
 FC_RUST = "#9D5F58"
@@ -66,9 +80,37 @@ st.markdown("# 🌾 PRF Live Rainfall Tracker")
 st.markdown("**Jan–Feb 2026 · Interval 625** · Real-time CPC rainfall vs 3-year implied normals")
 st.divider()
 
-@st.cache_data(ttl=3600)
+_INT32_COLS = ("GRID_ID",)
+_INT16_COLS = ("DAYS_COLLECTED",)
+_FLOAT32_COLS = ("NORMAL_IN", "RAIN_SO_FAR", "CV_PCT", "CENTER_LAT", "CENTER_LON")
+_STRING_COLS = ("COUNTY_NAME", "SIGNAL", "FILE_TYPE")
+
+def _downcast(df):
+    """Shrink numeric columns to 32/16-bit — values are small (inches,
+    grid IDs, day counts) and the frame is re-serialized on every rerun,
+    so halving the byte count halves transfer and cache size. Strings
+    move to Arrow-backed dtype so they stay packed buffers instead of
+    boxed Python objects and .str ops run on PyArrow kernels."""
+    for c in _INT32_COLS:
+        if c in df.columns:
+            df[c] = df[c].astype("int32")
+    for c in _INT16_COLS:
+        if c in df.columns:
+            df[c] = df[c].astype("int16")
+    for c in _FLOAT32_COLS:
+        if c in df.columns:
+            df[c] = df[c].astype("float32")
+    for c in _STRING_COLS:
+        if c in df.columns:
+            df[c] = df[c].astype("string[pyarrow]")
+    return df
+
+@st.cache_resource(ttl=3600)
 def load_texas_grids():
-    return session.sql("""
+    # cache_resource returns the frame by reference (no pickling or
+    # hashing on the cache boundary). Treat it as read-only — anything
+    # that writes must work on a .copy().
+    df = session.sql("""
         WITH grid_counties AS (
             SELECT TRY_TO_NUMBER(m.SUB_COUNTY_CODE) AS GRID_ID,
                    LISTAGG(DISTINCT c.COUNTY_NAME, ' / ') WITHIN GROUP (ORDER BY c.COUNTY_NAME) AS COUNTY_NAME
@@ -79,60 +121,160 @@ def load_texas_grids():
             WHERE m.INSURANCE_PLAN_CODE = '13' AND m.STATE_CODE = '48' AND m.DELETED_DATE IS NULL
             GROUP BY 1
         )
-        SELECT n.GRID_ID, n.NORMAL_IN, n.CV_PCT, n.CONFIDENCE_TIER, n.YEARS_USED,
-               gc.COUNTY_NAME, g.CENTER_LAT, g.CENTER_LON
+        SELECT n.GRID_ID, n.NORMAL_IN, n.CV_PCT, gc.COUNTY_NAME
         FROM PRF_GRID_NORMALS n
         JOIN grid_counties gc ON n.GRID_ID = gc.GRID_ID
-        LEFT JOIN PRF_GRID_REFERENCE g ON g.GRIDCODE = n.GRID_ID
         ORDER BY n.GRID_ID
     """).to_pandas()
+    return _downcast(df)
 
 @st.cache_data(ttl=600)
 def load_rainfall_2026():
-    return session.sql("""
-        SELECT g.GRIDCODE AS GRID_ID,
-               ROUND(SUM(r.PRECIP_IN), 4) AS RAIN_SO_FAR,
-               COUNT(DISTINCT r.OBSERVATION_DATE) AS DAYS_COLLECTED,
-               MAX(r.OBSERVATION_DATE) AS LAST_DAY,
-               MIN(r.FILE_TYPE) AS FILE_TYPE
-        FROM PRF_RAINFALL_REALTIME r
-        JOIN PRF_GRID_REFERENCE g
-            ON ROUND(r.LATITUDE, 3) = ROUND(g.CENTER_LAT, 3)
-            AND ROUND(r.LONGITUDE, 3) = ROUND(g.CENTER_LON, 3)
-        WHERE r.OBSERVATION_DATE BETWEEN '2026-01-01' AND '2026-02-28'
+    df = session.sql("""
+        SELECT GRID_ID,
+               ROUND(SUM(PRECIP_IN), 4) AS RAIN_SO_FAR,
+               COUNT(DISTINCT OBSERVATION_DATE) AS DAYS_COLLECTED,
+               MAX(OBSERVATION_DATE) AS LAST_DAY,
+               MIN(FILE_TYPE) AS FILE_TYPE
+        FROM PRF_RAINFALL_REALTIME_INDEXED
+        WHERE OBSERVATION_DATE BETWEEN ? AND ?
         GROUP BY 1
-    """).to_pandas()
+    """, params=[SEASON_START, SEASON_END]).to_pandas()
+    return _downcast(df)
+
+@st.cache_data(ttl=600)
+def load_tracker(coverage_level, top_n=None, likely_only=False):
+    """Tracker rows selected in Snowflake. The join, projection math,
+    sort and LIMIT all run warehouse-side, so only the rows actually
+    displayed come over the wire."""
+    if likely_only:
+        row_filter = f"WHERE PROJECTED_INDEX < {int(coverage_level)}"
+    elif top_n is not None:
+        row_filter = f"QUALIFY ROW_NUMBER() OVER (ORDER BY PROJECTED_INDEX) <= {int(top_n)}"
+    else:
+        row_filter = ""
+    df = session.sql(f"""
+        WITH grid_counties AS (
+            SELECT TRY_TO_NUMBER(m.SUB_COUNTY_CODE) AS GRID_ID,
+                   LISTAGG(DISTINCT c.COUNTY_NAME, ' / ') WITHIN GROUP (ORDER BY c.COUNTY_NAME) AS COUNTY_NAME
+            FROM MAP_YTD m
+            LEFT JOIN COUNTY_YTD c
+                ON c.STATE_CODE = '48' AND c.COUNTY_CODE = m.COUNTY_CODE
+                AND c.REINSURANCE_YEAR = 2025 AND c.DELETED_DATE IS NULL
+            WHERE m.INSURANCE_PLAN_CODE = '13' AND m.STATE_CODE = '48' AND m.DELETED_DATE IS NULL
+            GROUP BY 1
+        ),
+        rain AS (
+            SELECT GRID_ID,
+                   ROUND(SUM(PRECIP_IN), 4) AS RAIN_SO_FAR,
+                   COUNT(DISTINCT OBSERVATION_DATE) AS DAYS_COLLECTED
+            FROM PRF_RAINFALL_REALTIME_INDEXED
+            WHERE OBSERVATION_DATE BETWEEN ? AND ?
+            GROUP BY 1
+        ),
+        tracker AS (
+            SELECT n.GRID_ID, gc.COUNTY_NAME, n.NORMAL_IN, n.CV_PCT,
+                   r.RAIN_SO_FAR, r.DAYS_COLLECTED,
+                   ROUND(r.RAIN_SO_FAR / n.NORMAL_IN * 100, 1) AS PARTIAL_INDEX,
+                   ROUND(r.RAIN_SO_FAR / r.DAYS_COLLECTED * 59, 4) AS PROJECTED_RAIN,
+                   ROUND(r.RAIN_SO_FAR / r.DAYS_COLLECTED * 59 / n.NORMAL_IN * 100, 1) AS PROJECTED_INDEX
+            FROM PRF_GRID_NORMALS n
+            JOIN grid_counties gc ON n.GRID_ID = gc.GRID_ID
+            JOIN rain r ON r.GRID_ID = n.GRID_ID
+        )
+        SELECT t.*,
+               IFF(PROJECTED_INDEX < {int(coverage_level)}, 'LIKELY INDEMNITY', 'OK') AS SIGNAL
+        FROM tracker t
+        {row_filter}
+        ORDER BY PROJECTED_INDEX
+    """, params=[SEASON_START, SEASON_END]).to_pandas()
+    return _downcast(df)
+
+@st.cache_data(show_spinner=False)
+def _county_pattern(selected_counties):
+    """Regex alternation for the county filter, rebuilt only when the
+    multiselect changes."""
+    return "|".join(map(re.escape, selected_counties))
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def prep_sidebar(_grids_df):
+    """One-shot sidebar precompute: LABEL column, label→ID lookup, and
+    the unique county list. The leading-underscore arg skips Streamlit's
+    DataFrame hashing — the ttl matches load_texas_grids so the result
+    refreshes with the underlying frame."""
+    grids_df = _grids_df.copy()  # the cached resource is read-only
+    gid = grids_df["GRID_ID"].astype(str)
+    cname = grids_df["COUNTY_NAME"]
+    grids_df["LABEL"] = np.where(cname.notna(), gid + " — " + cname.fillna(""), gid)
+    label_to_id = dict(zip(grids_df["LABEL"].to_numpy(), grids_df["GRID_ID"].to_numpy()))
+    all_counties = sorted(
+        cname.dropna().str.split(" / ").explode().str.strip().unique().tolist()
+    )
+    return grids_df, label_to_id, all_counties
 
-def build_tracker(grids_df, rain_df, coverage_level):
+def build_tracker_ranking(grids_df, rain_df):
+    """Merge and compute PROJECTED_INDEX only — just enough to rank or
+    filter grids. The remaining columns are derived by enrich_rows on
+    the (much smaller) selected subset."""
     merged = grids_df.merge(rain_df, on="GRID_ID", how="inner")
-    total_days = 59
-    merged["PARTIAL_INDEX"] = (merged["RAIN_SO_FAR"] / merged["NORMAL_IN"] * 100).round(1)
-    merged["DAILY_RATE"] = merged["RAIN_SO_FAR"] / merged["DAYS_COLLECTED"]
-    merged["PROJECTED_RAIN"] = (merged["DAILY_RATE"] * total_days).round(4)
-    merged["PROJECTED_INDEX"] = (merged["PROJECTED_RAIN"] / merged["NORMAL_IN"] * 100).round(1)
-    trigger = coverage_level
-    merged["SIGNAL"] = merged["PROJECTED_INDEX"].apply(
-        lambda idx: "LIKELY INDEMNITY" if idx < trigger else "OK"
+    # eval fuses the whole chain into one numexpr pass — no intermediate
+    # array per operator, no pandas alignment per expression.
+    merged = merged.eval(
+        "PROJECTED_INDEX = RAIN_SO_FAR / DAYS_COLLECTED * 59 / NORMAL_IN * 100"
     )
+    merged["PROJECTED_INDEX"] = merged["PROJECTED_INDEX"].round(1).astype("float32")
     return merged
 
+def enrich_rows(subset, coverage_level):
+    """Derived display columns, computed only for the selected rows."""
+    total_days = 59
+    rain = subset["RAIN_SO_FAR"].to_numpy("float32")
+    norm = subset["NORMAL_IN"].to_numpy("float32")
+    days = subset["DAYS_COLLECTED"].to_numpy("float32")
+    daily = rain / days
+    return subset.assign(
+        PARTIAL_INDEX=np.round(rain / norm * 100, 1),
+        DAILY_RATE=daily,
+        PROJECTED_RAIN=np.round(daily * total_days, 4),
+        SIGNAL=np.where(
+            subset["PROJECTED_INDEX"].to_numpy() < coverage_level,
+            "LIKELY INDEMNITY", "OK",
+        ),
+    )
+
+
+def build_gauge_titles(display_df, coverage_level):
+    """Gauge title HTML for every row in one vectorized pass, instead of
+    re-interpolating seven f-strings per gauge on each rerun."""
+    gid = display_df["GRID_ID"].astype(str)
+    county = display_df["COUNTY_NAME"]
+    county_str = np.where(county.notna(), "  ·  " + county.fillna(""), "")
+    rain = display_df["RAIN_SO_FAR"].round(2).astype(str)
+    norm = display_df["NORMAL_IN"].round(1).astype(str)
+    days = display_df["DAYS_COLLECTED"].astype(str)
+    pct = (display_df["DAYS_COLLECTED"] / 59 * 100).round().astype(int).astype(str)
+    return (
+        "<b style='font-size:20px'>Grid " + gid + "</b>"
+        + f"<span style='font-size:13px;color:{FC_SLATE}'>" + county_str + "</span>"
+        + "<br>"
+        + f"<span style='font-size:14px;color:{FC_SLATE}'>"
+        + "Rain: <b>" + rain + "\"</b> of " + norm + "\" normal"
+        + "  ·  " + days + "/59 days (" + pct + "%)"
+        + f"  ·  Coverage: {coverage_level}%"
+        + "</span>"
+    )
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def create_gauge_trace(projected_index, partial_index, signal,
+                       coverage_level, title_html):
 
-def create_gauge(grid_id, projected_index, partial_index, signal, 
-                 rain_so_far, normal_in, days, coverage_level, county_name=None):
-    
     bar_color = FC_GREEN if signal == "LIKELY INDEMNITY" else FC_SLATE
-    
+
     trigger = coverage_level
     max_range = max(150, projected_index + 20)
-    pct_through = round(days / 59 * 100)
-    
-    county_str = ""
-    if county_name and pd.notna(county_name):
-        county_str = f"  ·  {county_name}"
-    
-    fig = go.Figure()
-    
-    fig.add_trace(go.Indicator(
+
+    return go.Indicator(
         mode="gauge+number",
         value=projected_index,
         number={
@@ -140,16 +282,7 @@ def create_gauge(grid_id, projected_index, partial_index, signal,
             "font": {"size": 64, "color": "#2d3a2e", "family": "Arial Black"},
         },
         title={
-            "text": (
-                f"<b style='font-size:20px'>Grid {grid_id}</b>"
-                f"<span style='font-size:13px;color:{FC_SLATE}'>{county_str}</span>"
-                f"<br>"
-                f"<span style='font-size:14px;color:{FC_SLATE}'>"
-                f"Rain: <b>{rain_so_far:.2f}\"</b> of {normal_in:.1f}\" normal"
-                f"  ·  {days}/59 days ({pct_through}%)"
-                f"  ·  Coverage: {coverage_level}%"
-                f"</span>"
-            ),
+            "text": title_html,
             "font": {"size": 14, "color": "#2d3a2e"},
         },
         gauge={
@@ -173,17 +306,74 @@ def create_gauge(grid_id, projected_index, partial_index, signal,
                 "value": partial_index,
             },
         },
-        domain={"x": [0.15, 0.85], "y": [0, 0.85]},
-    ))
-    
+    )
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def build_table(ids_tuple, coverage_level, _display_df):
+    """Detail table keyed on (selected grids, coverage) so an unchanged
+    selection re-serves identical bytes and Streamlit's diff engine
+    skips the update. The frame itself rides along unhashed."""
+    table_df = _display_df[[
+        "GRID_ID", "COUNTY_NAME", "NORMAL_IN", "DAYS_COLLECTED",
+        "RAIN_SO_FAR", "PARTIAL_INDEX", "PROJECTED_RAIN",
+        "PROJECTED_INDEX", "SIGNAL", "CV_PCT"
+    ]].copy()
+    table_df.columns = [
+        "Grid", "Counties", "Normal (in)", "Days",
+        "Rain (in)", "Current Idx", "Proj Rain (in)",
+        "Proj Index", "Signal", "CV%"
+    ]
+    # Keep numerics as float32 NumPy arrays (never object dtype) so the
+    # Arrow/base64 typed-array serialization path is taken end to end.
+    numeric_cols = ["Normal (in)", "Rain (in)", "Current Idx",
+                    "Proj Rain (in)", "Proj Index", "CV%"]
+    table_df[numeric_cols] = table_df[numeric_cols].astype("float32")
+    return table_df
+
+
+def _banner(row, coverage_level):
+    if row.SIGNAL == "LIKELY INDEMNITY":
+        return (
+            f'<div class="signal-indemnity">'
+            f'✅ LIKELY INDEMNITY — Current: {row.PARTIAL_INDEX:.1f}  ·  Projected: {row.PROJECTED_INDEX:.1f}  ·  Trigger: {coverage_level}'
+            f'</div>'
+        )
+    return (
+        f'<div class="signal-ok">'
+        f'OK — Current: {row.PARTIAL_INDEX:.1f}  ·  Projected: {row.PROJECTED_INDEX:.1f}'
+        f'</div>'
+    )
+
+
+def create_gauge_board(display_df, coverage_level):
+    """Stack every gauge into one subplot figure — a single serialization
+    round-trip and React mount regardless of how many grids are shown."""
+    n = len(display_df)
+    fig = make_subplots(
+        rows=n, cols=1,
+        specs=[[{"type": "indicator"}]] * n,
+        vertical_spacing=min(0.02, 1 / max(n - 1, 1)),
+    )
+    titles = build_gauge_titles(display_df, coverage_level)
+    for i, (row, title_html) in enumerate(zip(display_df.itertuples(index=False), titles)):
+        trace = create_gauge_trace(
+            projected_index=round(float(row.PROJECTED_INDEX), 1),
+            partial_index=round(float(row.PARTIAL_INDEX), 1),
+            signal=row.SIGNAL,
+            coverage_level=coverage_level,
+            title_html=title_html,
+        )
+        fig.add_trace(trace, row=i + 1, col=1)
+
     fig.update_layout(
-        height=300,
+        height=300 * n,
         margin=dict(l=20, r=20, t=100, b=10),
         paper_bgcolor=FC_CREAM,
         plot_bgcolor=FC_CREAM,
         font={"color": "#2d3a2e"},
+        transition_duration=0,
     )
-    
     return fig
 
 
@@ -202,23 +392,13 @@ with st.sidebar:
     
     st.divider()
     
-    grids_df["LABEL"] = grids_df.apply(
-        lambda r: f"{r['GRID_ID']} — {r['COUNTY_NAME']}" 
-        if pd.notna(r.get("COUNTY_NAME")) else str(r["GRID_ID"]), axis=1
-    )
-    label_to_id = dict(zip(grids_df["LABEL"], grids_df["GRID_ID"]))
-    
-    all_counties = set()
-    for names in grids_df["COUNTY_NAME"].dropna():
-        for c in names.split(" / "):
-            all_counties.add(c.strip())
-    
-    selected_counties = st.multiselect("Filter by County", sorted(all_counties), default=[])
+    grids_df, label_to_id, all_counties = prep_sidebar(grids_df)
+
+    selected_counties = st.multiselect("Filter by County", all_counties, default=[])
     
     if selected_counties:
-        mask = grids_df["COUNTY_NAME"].apply(
-            lambda x: any(c in str(x) for c in selected_counties) if pd.notna(x) else False
-        )
+        pattern = _county_pattern(tuple(selected_counties))
+        mask = grids_df["COUNTY_NAME"].str.contains(pattern, regex=True, na=False)
         filtered_labels = grids_df[mask]["LABEL"].tolist()
     else:
         filtered_labels = grids_df["LABEL"].tolist()
@@ -252,25 +432,26 @@ with st.sidebar:
 
 # ─── MAIN ───
 if generate:
-    rain_df = load_rainfall_2026()
-    tracker = build_tracker(grids_df, rain_df, coverage_level)
-    
     display_df = None
     if grid_entry and grid_entry.strip():
         try:
             typed_ids = [int(x.strip()) for x in grid_entry.split(",") if x.strip()]
-            display_df = tracker[tracker["GRID_ID"].isin(typed_ids)].copy()
         except ValueError:
             st.error("Invalid grid IDs. Use comma-separated numbers like: 7929, 8230")
             st.stop()
+        tracker = build_tracker_ranking(grids_df, load_rainfall_2026())
+        display_df = enrich_rows(tracker[tracker["GRID_ID"].isin(typed_ids)], coverage_level)
     elif selected_labels:
         selected_ids = [label_to_id[lbl] for lbl in selected_labels]
-        display_df = tracker[tracker["GRID_ID"].isin(selected_ids)].copy()
+        tracker = build_tracker_ranking(grids_df, load_rainfall_2026())
+        display_df = enrich_rows(tracker[tracker["GRID_ID"].isin(selected_ids)], coverage_level)
     elif show_all_likely:
-        display_df = tracker[tracker["SIGNAL"] == "LIKELY INDEMNITY"].copy()
+        # Selection pushed down into SQL — only matching rows transfer.
+        display_df = load_tracker(coverage_level, likely_only=True)
     else:
-        n = len(tracker) if top_n == "All" else int(top_n)
-        display_df = tracker.nsmallest(n, "PROJECTED_INDEX").copy()
+        display_df = load_tracker(
+            coverage_level, top_n=None if top_n == "All" else int(top_n)
+        )
     
     if display_df is None or display_df.empty:
         st.warning("No grids found.")
@@ -313,51 +494,28 @@ if generate:
     </div>
     """, unsafe_allow_html=True)
     
-    for _, row in display_df.iterrows():
-        fig = create_gauge(
-            grid_id=row["GRID_ID"],
-            projected_index=row["PROJECTED_INDEX"],
-            partial_index=row["PARTIAL_INDEX"],
-            signal=row["SIGNAL"],
-            rain_so_far=row["RAIN_SO_FAR"],
-            normal_in=row["NORMAL_IN"],
-            days=row["DAYS_COLLECTED"],
-            coverage_level=coverage_level,
-            county_name=row.get("COUNTY_NAME"),
-        )
-        st.plotly_chart(fig, use_container_width=True)
-        
-        sig = row["SIGNAL"]
-        proj = row["PROJECTED_INDEX"]
-        part = row["PARTIAL_INDEX"]
-        if sig == "LIKELY INDEMNITY":
-            st.markdown(
-                f'<div class="signal-indemnity">'
-                f'✅ LIKELY INDEMNITY — Current: {part:.1f}  ·  Projected: {proj:.1f}  ·  Trigger: {coverage_level}'
-                f'</div>', unsafe_allow_html=True)
-        else:
-            st.markdown(
-                f'<div class="signal-ok">'
-                f'OK — Current: {part:.1f}  ·  Projected: {proj:.1f}'
-                f'</div>', unsafe_allow_html=True)
-        
-        st.markdown("")
-    
+    # Gauges are read-only: staticPlot drops Plotly's event-listener
+    # setup entirely, which adds up with many gauges on screen.
+    st.plotly_chart(
+        create_gauge_board(display_df, coverage_level),
+        use_container_width=True,
+        config={"displayModeBar": False, "staticPlot": True, "responsive": False},
+    )
+
+    # One websocket message for all banners instead of two per grid.
+    banner_html = "\n".join(
+        _banner(row, coverage_level) for row in display_df.itertuples(index=False)
+    )
+    st.markdown(banner_html, unsafe_allow_html=True)
+
     st.divider()
     
     st.markdown("### 📋 Detail")
     
-    table_df = display_df[[
-        "GRID_ID", "COUNTY_NAME", "NORMAL_IN", "DAYS_COLLECTED",
-        "RAIN_SO_FAR", "PARTIAL_INDEX", "PROJECTED_RAIN", 
-        "PROJECTED_INDEX", "SIGNAL", "CV_PCT"
-    ]].copy()
-    table_df.columns = [
-        "Grid", "Counties", "Normal (in)", "Days", 
-        "Rain (in)", "Current Idx", "Proj Rain (in)",
-        "Proj Index", "Signal", "CV%"
-    ]
-    
+    table_df = build_table(
+        tuple(display_df["GRID_ID"].tolist()), coverage_level, display_df
+    )
+
     st.dataframe(
         table_df, use_container_width=True, hide_index=True,
         height=min(600, 50 + len(table_df) * 40),